@@ -24,11 +24,42 @@ import os          # Access environment variables (API keys, config)
 import sys         # System operations (exit codes, stderr)
 import logging     # Track what's happening (debugging, monitoring)
 import json        # Parse/create JSON (MCP uses JSON-RPC)
+import asyncio     # Hand blocking work to worker pools
+import functools   # Bind arguments for executor calls
+import time        # Measure how busy the worker pools are
+import multiprocessing  # Start method for the process pool
+import inspect     # Check job arguments before starting a job
+import uuid        # Job ids
+import cProfile    # Optional whole-process profiling (KAREN_PROFILE_DIR)
 import random      # Pick random fallback responses (variety!)
+import gzip        # Compact cassette files for record/replay
+import mmap        # Read the response store straight from the page cache
+import struct      # Fixed-size binary records for the response store
+import zlib        # crc32 to tag stored responses by tool
+import math        # Round token caps up
+import hashlib     # Cache keys
+import sqlite3     # Shared on-disk cache tier
+import threading   # Guard the SQLite connection across worker threads
+import weakref     # Per-session log levels that go away with the session
+from collections import deque, OrderedDict  # Token usage windows, LRU cache
+from urllib.parse import urlsplit  # Parse CACHE_URL
+from array import array  # Compact per-tool record lists
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor  # Worker pools
 from datetime import datetime  # Timestamps for responses
 
+import tracemalloc  # Memory audit mode (KAREN_MEMORY_AUDIT)
+
+# Start tracing before httpx and mcp are imported so their memory is counted too
+if os.environ.get("KAREN_MEMORY_AUDIT", "").lower() in ("1", "true", "yes"):
+    tracemalloc.start(25)  # Keep enough frames to look past importlib internals
+
+try:
+    import fcntl   # File locks so several stdio sessions can share one store
+except ImportError:  # Windows has no fcntl - appends are still safe for one process
+    fcntl = None
+
 import httpx       # HTTP client for OpenAI API (async-capable)
-from mcp.server.fastmcp import FastMCP  # The MCP magic! 🎉
+from mcp.server.fastmcp import FastMCP, Context  # The MCP magic! 🎉
 
 # Configure logging to stderr
 logging.basicConfig(
@@ -44,7 +75,11 @@ logger = logging.getLogger("karen-server")
 #    - Never mix them or MCP protocol breaks!
 
 # Initialize MCP server
-mcp = FastMCP("karen")
+mcp = FastMCP(
+    "karen",
+    host=os.environ.get("MCP_HOST", "127.0.0.1"),  # Only used by the HTTP transports
+    port=int(os.environ.get("MCP_PORT", "8000")),
+)
 
 # 💡 LEARNING: This single line creates an MCP server!
 #    FastMCP handles all the protocol details for you:
@@ -59,11 +94,57 @@ mcp = FastMCP("karen")
 # ============================================================================
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")  # API key from Docker secrets
 OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-3.5-turbo")  # Which AI model to use
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")  # Point at a fake for load tests
 API_TIMEOUT = 30  # Don't wait forever for OpenAI
 
 # Imgflip API credentials (optional - works without auth but has rate limits)
 IMGFLIP_USERNAME = os.environ.get("IMGFLIP_USERNAME", "")
 IMGFLIP_PASSWORD = os.environ.get("IMGFLIP_PASSWORD", "")
+IMGFLIP_API_URL = os.environ.get("IMGFLIP_API_URL", "https://api.imgflip.com").rstrip("/")
+
+# How clients connect: "stdio" (default), "streamable-http" or "sse"
+# HTTP transports listen on MCP_HOST / MCP_PORT (default 127.0.0.1:8000)
+MCP_TRANSPORT = os.environ.get("MCP_TRANSPORT", "stdio")
+
+# Write a cProfile dump of the whole server process here on exit (empty = off)
+KAREN_PROFILE_DIR = os.environ.get("KAREN_PROFILE_DIR", "")
+
+# Background jobs (start_job / get_job_result): concurrent workers, cap on
+# queued + running jobs, how long finished results are kept (seconds) and
+# how many finished results are kept at most (oldest dropped first)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_MAX_OUTSTANDING = int(os.environ.get("JOB_MAX_OUTSTANDING", "100"))
+JOB_TTL = float(os.environ.get("JOB_TTL", "600"))
+JOB_MAX_FINISHED = int(os.environ.get("JOB_MAX_FINISHED", "500"))
+
+# Learn each tool's real answer length and lower max_tokens to match (0 = always use the profile cap)
+ADAPTIVE_MAX_TOKENS = os.environ.get("ADAPTIVE_MAX_TOKENS", "1").lower() not in ("0", "false", "no")
+
+# Cache upstream results: CACHE_TTL seconds (0 = off), in-process LRU size, and
+# an optional shared tier (sqlite:///data/karen-cache.db or redis://host:6379/0)
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "0"))
+CACHE_L1_SIZE = int(os.environ.get("CACHE_L1_SIZE", "256"))
+CACHE_URL = os.environ.get("CACHE_URL", "")
+
+# Record/replay upstream traffic for reproducible perf runs:
+# UPSTREAM_MODE = live (default), record (save every OpenAI/Imgflip call to
+# CASSETTE_PATH) or replay (serve them back, sleeping the original latency
+# times REPLAY_LATENCY_SCALE - 0 means no delay)
+UPSTREAM_MODE = os.environ.get("UPSTREAM_MODE", "live").lower()
+CASSETTE_PATH = os.environ.get("CASSETTE_PATH", "karen-cassette.jsonl.gz")
+REPLAY_LATENCY_SCALE = float(os.environ.get("REPLAY_LATENCY_SCALE", "1.0"))
+
+# Seed for every random choice the server makes (any string; empty = different every run)
+KAREN_SEED = os.environ.get("KAREN_SEED", "")
+rng = random.Random(KAREN_SEED) if KAREN_SEED else random.Random()
+
+# Where to keep every successful AI response for offline mode (empty = disabled)
+RESPONSE_STORE_PATH = os.environ.get("RESPONSE_STORE_PATH", "")
+
+# Worker pools for blocking / CPU-heavy work (0 = let Python pick a size)
+EXECUTOR_THREADS = int(os.environ.get("EXECUTOR_THREADS", "0"))
+EXECUTOR_PROCESSES = int(os.environ.get("EXECUTOR_PROCESSES", "0"))
+EXECUTOR_MAX_PENDING = int(os.environ.get("EXECUTOR_MAX_PENDING", "64"))  # Per pool, before callers wait
 
 # Popular meme templates perfect for PM Karen behavior
 PM_MEME_TEMPLATES = {
@@ -79,119 +160,1043 @@ PM_MEME_TEMPLATES = {
     "expanding_brain": "93895088",  # Evolution of terrible PM ideas
 }
 
+
+class MemeSpec:
+    """Which template to use for a scenario keyword, and the caption for each box."""
+
+    __slots__ = ("keyword", "template_id", "texts")  # No per-instance __dict__
+
+    def __init__(self, keyword: str, template_id: str, *texts: str):
+        self.keyword = keyword
+        self.template_id = template_id
+        self.texts = texts
+
+
+# Scenario keyword -> meme (first match wins, built once instead of on every call)
+MEME_SPECS = (
+    MemeSpec("deadline", PM_MEME_TEMPLATES["drake"],
+             "Following realistic sprint planning", "Promising features by tomorrow"),
+    MemeSpec("competitor", PM_MEME_TEMPLATES["distracted_boyfriend"],
+             "Our Technical Roadmap", "PM", "Competitor's Feature Screenshot"),
+    MemeSpec("process", PM_MEME_TEMPLATES["drake"],
+             "Testing and code review", "Shipping untested code immediately"),
+    MemeSpec("estimate", PM_MEME_TEMPLATES["is_this"],
+             "Is this a simple 5-minute change?", "Complex 3-sprint feature"),
+    MemeSpec("fire", PM_MEME_TEMPLATES["this_is_fine"],
+             "Everything is going", "exactly as planned"),
+    MemeSpec("simple", PM_MEME_TEMPLATES["change_my_mind"],
+             "This is just adding a button", "Change my mind"),
+    MemeSpec("buttons", PM_MEME_TEMPLATES["two_buttons"],
+             "Follow development process", "Ship broken feature fast"),
+    MemeSpec("testing", PM_MEME_TEMPLATES["one_does_not_simply"],
+             "One does not simply", "Skip testing in production"),
+)
+
 # 💡 LEARNING: NEVER hardcode secrets in your code!
 #    - Use environment variables (os.environ.get)
 #    - Docker MCP secrets become environment variables
 #    - Default to empty string if not set (enables fallbacks)
 
-# Pre-defined Karen PM responses for fallback
+# Pre-defined Karen PM responses for fallback (read-only, so tuples - smaller than lists)
 FALLBACK_RESPONSES = {
-    "demand_feature_immediately": [
+    "demand_feature_immediately": (
         "This should be a SIMPLE 5-minute change, right?! Can't you just ADD A BUTTON for that?! I promised the client this would be ready by TOMORROW!",
         "Why is this taking so long?! Just copy the code from that other feature! This is BLOCKING everything!",
         "I don't understand why this is complicated! Just make it work! I'm escalating this to the C-suite!"
-    ],
-    "override_engineering_estimate": [
+    ),
+    "override_engineering_estimate": (
         "Three sprints?! I need it by FRIDAY! Why can't we just use AI to build it?! This is just making excuses!",
         "That estimate sounds like padding to me! Just copy the code from somewhere else! How hard can it be?!",
         "I'm overriding that estimate! This is definitely a one-day task! Stop being so negative!"
-    ],
-    "change_requirements_post_deployment": [
+    ),
+    "change_requirements_post_deployment": (
         "Actually, what I MEANT was... This is just ONE small thing! Why didn't you BUILD what I was thinking?!",
         "The client just clarified... (they never said that!) This should be a MINOR change! Why is this so hard?!",
         "It's already built, just TWEAK it a little! This was OBVIOUSLY what I wanted from the beginning!"
-    ],
-    "schedule_unnecessary_meeting": [
+    ),
+    "schedule_unnecessary_meeting": (
         "Let's circle back on this! I think we need to align! Let's get EVERYONE in a room for 2 hours to discuss this button!",
         "This deserves its own meeting! We need to sync up! I'm scheduling a follow-up meeting to discuss the follow-up!",
         "Let's take this offline! I'm booking the conference room for the whole afternoon to discuss this footer text!"
-    ],
-    "request_daily_status_updates": [
+    ),
+    "request_daily_status_updates": (
         "Can you give me HOURLY updates?! I need to see progress DAILY! What EXACTLY are you working on right NOW?!",
         "Why isn't this moving faster?! The client is asking for updates! Send me screenshots of your screen!",
         "I need granular details on every line of code! How can I report progress to leadership without knowing EVERYTHING?!"
-    ],
-    "create_urgent_non_urgent_task": [
+    ),
+    "create_urgent_non_urgent_task": (
         "This is URGENT! Drop everything and update this footer text! This should have been done YESTERDAY!",
         "The client is expecting this TODAY! This is TOP PRIORITY! I promised this would be ready this morning!",
         "This is blocking EVERYTHING! Why didn't anyone tell me updating one word would take so long?!"
-    ],
-    "bypass_development_process": [
+    ),
+    "bypass_development_process": (
         "We don't have time for process! Can't we just push it live?! Testing is optional for this feature!",
         "Let's skip the review and deploy! The client won't notice if there are bugs! We'll fix them later!",
         "Process is slowing us down! Just make it work! Security review is just paperwork anyway!"
-    ],
-    "demand_impossible_integration": [
+    ),
+    "demand_impossible_integration": (
         "Can't they just talk to each other?! It's all software, right?! Just make our COBOL mainframe work with this AI chatbot!",
         "How hard can integration be?! They're both computers! Just sync the data between 1970s and 2025 systems!",
         "Make it seamless! I don't understand why connecting incompatible architectures is complicated!"
-    ],
-    "generate_sarcastic_status_update": [
+    ),
+    "generate_sarcastic_status_update": (
         "Everything is going EXACTLY as planned... if your plan was chaos and missed deadlines!",
         "We're definitely shipping Friday! According to the timeline that exists only in my dreams!",
         "Progress is AMAZING! If we measure success by meetings held instead of features shipped!"
-    ],
-    "random_feature_request": [
+    ),
+    "random_feature_request": (
         "Change ALL fonts to Comic Sans! The client will LOVE it! It's professional!",
         "Rebrand the entire project as 'Project Karen 2.0'! We need a FRESH start!",
         "Add a dancing paperclip assistant! It worked for Microsoft in the 90s!"
-    ],
-    "generate_pm_meme": [
+    ),
+    "generate_pm_meme": (
         "🎨 Meme generation failed, but imagine a Drake meme: Top panel 'Following sprint planning' ❌, Bottom panel 'Demanding features by tomorrow' ✅",
         "🎨 Picture this meme: Distracted Boyfriend looking at 'Competitor's Feature' while ignoring 'Technical Debt'",
         "🎨 Imagine the 'This is Fine' meme but it's a PM saying 'Everything is on track' while the roadmap burns"
-    ]
+    )
 }
 
 # Company policies (made up)
-FAKE_POLICIES = [
+FAKE_POLICIES = (
     "According to Section 4.7 of the Customer Service Charter, all complaints must be escalated within 2 minutes.",
     "Corporate Policy 12-B clearly states that customers are entitled to speak with senior management upon request.",
     "The Customer Rights Act of 2019 mandates immediate supervisor involvement for service issues.",
     "Company Protocol 7.3 requires management approval for any customer interaction lasting more than 30 seconds."
-]
+)
+
+# ============================================================================
+# GENERATION PROFILES - Ask for Only as Many Tokens as Each Tool Needs
+# ============================================================================
+
+class GenerationProfile:
+    """OpenAI sampling settings for one tool: hard max_tokens cap, temperature, stop sequences."""
+
+    __slots__ = ("max_tokens", "temperature", "stop")
+
+    def __init__(self, max_tokens: int, temperature: float = 0.8, stop: tuple = ()):
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.stop = stop
+
+
+DEFAULT_GENERATION_PROFILE = GenerationProfile(300)
+
+# Every tool starts at the original 300-token cap - TokenBudget lowers it from
+# real usage. Add entries here for tools that need their own temperature or stop.
+GENERATION_PROFILES = {}
+
+
+class TokenBudget:
+    """Feedback loop: tracks usage.completion_tokens per tool and tightens max_tokens.
+
+    Once a tool has ``min_samples`` answers, its cap becomes the 95th percentile
+    plus ``headroom`` (never above the profile cap, never below ``floor``).
+    An answer cut off by the cap (finish_reason "length") throws the learned
+    numbers away, so the tool goes back to its full profile cap.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20, headroom: float = 1.25, floor: int = 40):
+        self.window = window
+        self.min_samples = min_samples
+        self.headroom = headroom
+        self.floor = floor
+        self._samples = {}
+        self._truncated = {}
+
+    def max_tokens(self, tool_type: str, profile: GenerationProfile) -> int:
+        samples = self._samples.get(tool_type)
+        if not samples or len(samples) < self.min_samples:
+            return profile.max_tokens
+        p95 = sorted(samples)[math.ceil(0.95 * len(samples)) - 1]
+        return min(profile.max_tokens, max(self.floor, math.ceil(p95 * self.headroom)))
+
+    def record(self, tool_type: str, completion_tokens, truncated: bool = False) -> None:
+        if truncated:
+            self._truncated[tool_type] = self._truncated.get(tool_type, 0) + 1
+            self._samples.pop(tool_type, None)
+            return
+        if isinstance(completion_tokens, int) and completion_tokens > 0:
+            self._samples.setdefault(tool_type, deque(maxlen=self.window)).append(completion_tokens)
+
+    def stats(self) -> dict:
+        report = {}
+        for tool_type in sorted(set(GENERATION_PROFILES) | set(self._samples) | set(self._truncated)):
+            profile = GENERATION_PROFILES.get(tool_type, DEFAULT_GENERATION_PROFILE)
+            samples = sorted(self._samples.get(tool_type, ()))
+            report[tool_type] = {
+                "profile_max_tokens": profile.max_tokens,
+                "current_max_tokens": self.max_tokens(tool_type, profile),
+                "samples": len(samples),
+                "p50_completion_tokens": samples[len(samples) // 2] if samples else None,
+                "max_completion_tokens": samples[-1] if samples else None,
+                "truncated": self._truncated.get(tool_type, 0),
+            }
+        return report
+
+
+token_budget = TokenBudget()
+
+# 💡 LEARNING: OpenAI latency grows with every token it writes!
+#    - Each tool asks for only as many tokens as its answers need
+#    - TokenBudget learns real answer lengths and lowers the cap
+#    - Read karen://metrics/generation to watch it adapt
+
+# ============================================================================
+# RESPONSE STORE - Remember Every Good Answer for Offline Mode
+# ============================================================================
+
+class ResponseStore:
+    """Append-only on-disk log of AI responses, sampled via mmap when offline.
+
+    ``<path>`` holds length-prefixed UTF-8 records and ``<path>.idx`` holds one
+    fixed-size ``(tool_crc32, offset, length)`` entry per record.
+    """
+
+    RECORD_HEADER = struct.Struct("<I")
+    INDEX_ENTRY = struct.Struct("<IQI")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = path + ".idx"
+        self._data_map = None
+        self._index_map = None
+        self._indexed = 0
+        self._by_tool = {}  # tool crc32 -> array of index entry numbers
+
+    @staticmethod
+    def _tool_key(tool_type: str) -> int:
+        return zlib.crc32(tool_type.encode("utf-8"))
+
+    def append(self, tool_type: str, text: str) -> None:
+        """Append one response; the index entry is written only after its data."""
+        payload = text.encode("utf-8")
+        with open(self.path, "ab") as data, open(self.index_path, "ab") as index:
+            if fcntl:
+                fcntl.flock(index, fcntl.LOCK_EX)
+            try:
+                # A crash mid-write can leave a partial index entry - drop it so entries stay aligned
+                index.truncate(index.seek(0, os.SEEK_END) // self.INDEX_ENTRY.size * self.INDEX_ENTRY.size)
+                data.seek(0, os.SEEK_END)
+                offset = data.tell() + self.RECORD_HEADER.size
+                data.write(self.RECORD_HEADER.pack(len(payload)) + payload)
+                data.flush()
+                index.write(self.INDEX_ENTRY.pack(self._tool_key(tool_type), offset, len(payload)))
+                index.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(index, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        """Remap the files if other writers appended since we last looked."""
+        try:
+            entries = os.path.getsize(self.index_path) // self.INDEX_ENTRY.size
+        except OSError:
+            return
+        if entries <= self._indexed:
+            return
+        self.close()
+        with open(self.index_path, "rb") as index, open(self.path, "rb") as data:
+            self._index_map = mmap.mmap(index.fileno(), entries * self.INDEX_ENTRY.size, access=mmap.ACCESS_READ)
+            self._data_map = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+        # Only the new tail of the index is scanned - older entries are already bucketed
+        start = self._indexed * self.INDEX_ENTRY.size
+        for number, (tool_key, _, _) in enumerate(self.INDEX_ENTRY.iter_unpack(self._index_map[start:]), self._indexed):
+            self._by_tool.setdefault(tool_key, array("I")).append(number)
+        self._indexed = entries
+
+    def count(self, tool_type: str) -> int:
+        """How many stored responses exist for a tool."""
+        self._refresh()
+        return len(self._by_tool.get(self._tool_key(tool_type), ()))
+
+    def sample(self, tool_type: str) -> str:
+        """Pick a random stored response for a tool ("" if there are none)."""
+        self._refresh()
+        numbers = self._by_tool.get(self._tool_key(tool_type))
+        if not numbers:
+            return ""
+        _, offset, length = self.INDEX_ENTRY.unpack_from(self._index_map, rng.choice(numbers) * self.INDEX_ENTRY.size)
+        with memoryview(self._data_map)[offset:offset + length] as record:
+            return str(record, "utf-8")
+
+    def close(self) -> None:
+        for mapped in (self._index_map, self._data_map):
+            if mapped is not None:
+                mapped.close()
+        self._index_map = self._data_map = None
+
+
+response_store = ResponseStore(RESPONSE_STORE_PATH) if RESPONSE_STORE_PATH else None
+
+# 💡 LEARNING: Fallbacks don't have to be boring!
+#    - Every real AI answer is appended to a log on disk
+#    - Offline, we mmap the log: the OS pages in only the records we read
+#    - Several server processes can share one store (and its page cache)
+
+# ============================================================================
+# WORKER POOLS - Keep the Event Loop Free for JSON-RPC
+# ============================================================================
+
+def _timed_call(fn, args):
+    """Run fn(*args) inside a worker and report how long it kept the worker busy."""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+class WorkerPools:
+    """Thread and process pools for tool handlers, with backpressure and utilization metrics.
+
+    Use ``run_in_thread`` for blocking I/O and ``run_in_process`` for CPU-bound work.
+    Process-pool functions and arguments must be picklable (module-level functions).
+    """
+
+    KINDS = ("thread", "process")
+
+    def __init__(self, threads: int = 0, processes: int = 0, max_pending: int = 64):
+        self.workers = {
+            "thread": threads or min(32, (os.cpu_count() or 1) + 4),
+            "process": processes or os.cpu_count() or 1,
+        }
+        self.max_pending = max(1, max_pending)
+        self._executors = {}
+        self._slots = {}
+        self._started = time.monotonic()
+        self._stats = {
+            kind: {"submitted": 0, "completed": 0, "failed": 0, "running": 0, "waiting": 0, "busy_seconds": 0.0}
+            for kind in self.KINDS
+        }
+
+    def _executor(self, kind: str):
+        # Pools start lazily - most sessions never need a process pool at all
+        if kind not in self._executors:
+            if kind == "thread":
+                self._executors[kind] = ThreadPoolExecutor(self.workers[kind], thread_name_prefix="karen-worker")
+            else:
+                # "spawn" avoids forking a process that already runs an event loop and threads
+                self._executors[kind] = ProcessPoolExecutor(
+                    self.workers[kind], mp_context=multiprocessing.get_context("spawn")
+                )
+        return self._executors[kind]
+
+    async def _submit(self, kind: str, fn, args):
+        stats = self._stats[kind]
+        if kind not in self._slots:
+            self._slots[kind] = asyncio.Semaphore(self.max_pending)
+        slots = self._slots[kind]
+        
+        # Backpressure: once max_pending jobs are queued or running, callers wait here
+        stats["waiting"] += 1
+        try:
+            await slots.acquire()
+        finally:
+            stats["waiting"] -= 1
+        
+        stats["submitted"] += 1
+        stats["running"] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result, busy = await loop.run_in_executor(self._executor(kind), _timed_call, fn, args)
+        except Exception:
+            stats["failed"] += 1
+            raise
+        else:
+            stats["completed"] += 1
+            stats["busy_seconds"] += busy
+            return result
+        finally:
+            stats["running"] -= 1
+            slots.release()
+
+    async def run_in_thread(self, fn, *args, **kwargs):
+        """Run a blocking function on the thread pool without stalling the event loop."""
+        return await self._submit("thread", functools.partial(fn, **kwargs) if kwargs else fn, args)
+
+    async def run_in_process(self, fn, *args, **kwargs):
+        """Run a CPU-bound function on the process pool so it can use every core."""
+        return await self._submit("process", functools.partial(fn, **kwargs) if kwargs else fn, args)
+
+    def stats(self) -> dict:
+        """Queue depth, throughput and utilization (busy time / capacity) per pool."""
+        uptime = max(time.monotonic() - self._started, 1e-9)
+        report = {}
+        for kind in self.KINDS:
+            stats = dict(self._stats[kind])
+            stats["workers"] = self.workers[kind]
+            stats["max_pending"] = self.max_pending
+            stats["utilization"] = round(stats["busy_seconds"] / (uptime * self.workers[kind]), 4)
+            stats["busy_seconds"] = round(stats["busy_seconds"], 4)
+            report[kind] = stats
+        return report
+
+    def shutdown(self) -> None:
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executors.clear()
+
+
+worker_pools = WorkerPools(EXECUTOR_THREADS, EXECUTOR_PROCESSES, EXECUTOR_MAX_PENDING)
+
+# 💡 LEARNING: One event loop serves EVERY MCP request!
+#    - Blocking file I/O or heavy CPU work inside a tool freezes all of them
+#    - await worker_pools.run_in_thread(...) for blocking I/O
+#    - await worker_pools.run_in_process(...) for CPU-bound work (all cores!)
+#    - Read karen://metrics/workers to see queue depth and utilization
+
+# ============================================================================
+# MEMORY AUDIT - Where Does Each Session's RSS Go?
+# ============================================================================
+
+def deep_sizeof(obj, seen=None) -> int:
+    """Bytes held by obj and everything it references (shared objects counted once)."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(deep_sizeof(getattr(obj, slot), seen) for slot in obj.__slots__ if hasattr(obj, slot))
+    return size
+
+
+def memory_audit(top: int = 15) -> dict:
+    """Per-module (tracemalloc) and per-structure memory for this process."""
+    report = {"process": process_stats(), "tracing": tracemalloc.is_tracing()}
+    report["structures"] = {
+        "FALLBACK_RESPONSES": deep_sizeof(FALLBACK_RESPONSES),
+        "FAKE_POLICIES": deep_sizeof(FAKE_POLICIES),
+        "PM_MEME_TEMPLATES": deep_sizeof(PM_MEME_TEMPLATES),
+        "MEME_SPECS": deep_sizeof(MEME_SPECS),
+        "response_store_index": deep_sizeof(response_store._by_tool) if response_store else 0,
+    }
+    if not report["tracing"]:
+        return report
+    
+    current, peak = tracemalloc.get_traced_memory()
+    report["traced_bytes"] = {"current": current, "peak": peak}
+    
+    # Group allocations by top-level package (httpx, mcp, pydantic, karen_server, ...)
+    packages = {
+        getattr(module, "__file__", None): name.split(".")[0]
+        for name, module in list(sys.modules.items())
+    }
+    by_package = {}
+    for trace in tracemalloc.take_snapshot().traces:
+        # Charge each block to the innermost real source file (not "<frozen importlib...>")
+        frames = list(reversed(trace.traceback))
+        filename = next((f.filename for f in frames if not f.filename.startswith("<")), frames[0].filename)
+        package = packages.get(filename, os.path.basename(filename))
+        by_package[package] = by_package.get(package, 0) + trace.size
+    report["by_module"] = dict(sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top])
+    return report
+
+# 💡 LEARNING: In stdio mode EVERY client gets its own server process!
+#    - Set KAREN_MEMORY_AUDIT=1 and read karen://metrics/memory to see where RSS goes
+#    - Read-only tables are tuples, specs use __slots__
+#    - The response store is mmapped, so processes share those pages
+
+# ============================================================================
+# CACHE - Share Results Across Sessions and Processes
+# ============================================================================
+
+def cache_key(*parts: str) -> str:
+    """Stable key for a cached upstream call."""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def pack_value(value) -> bytes:
+    """Compact serialization: tight JSON, zlib-compressed when that pays off."""
+    raw = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(raw) > 256:
+        compressed = zlib.compress(raw, 6)
+        if len(compressed) < len(raw):
+            return b"z" + compressed
+    return b"j" + raw
+
+
+def unpack_value(data: bytes):
+    if data[:1] == b"z":
+        return json.loads(zlib.decompress(data[1:]))
+    return json.loads(data[1:])
+
+
+class SQLiteCache:
+    """L2 cache in a local SQLite file - put it on a volume shared by all server containers."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sets = 0
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)")
+
+    def _get(self, key: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: bytes, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", (key, value, now + ttl))
+            self._sets += 1
+            if self._sets % 100 == 0:  # Sweep expired rows now and then
+                self._db.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+
+    def _lock_key(self, key: str, ttl: float):
+        now = time.time()
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute("DELETE FROM cache WHERE key = ? AND expires <= ?", ("lock:" + key, now))
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO cache VALUES (?, ?, ?)", ("lock:" + key, token, now + ttl)
+            )
+            return token if cursor.rowcount == 1 else False
+
+    def _unlock_key(self, key: str, token: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM cache WHERE key = ? AND value = ?", ("lock:" + key, token))
+
+    # SQLite calls block, so they run on the worker thread pool
+    async def get(self, key: str):
+        return await worker_pools.run_in_thread(self._get, key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await worker_pools.run_in_thread(self._set, key, value, ttl)
+
+    async def lock(self, key: str, ttl: float):
+        return await worker_pools.run_in_thread(self._lock_key, key, ttl)
+
+    async def unlock(self, key: str, token: str) -> None:
+        await worker_pools.run_in_thread(self._unlock_key, key, token)
+
+
+class RedisCache:
+    """L2 cache on any Redis-protocol server (Redis, Valkey, KeyDB, ...), no extra dependency."""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.tls = parts.scheme == "rediss"
+        self.username = parts.username
+        self.password = parts.password
+        self.db = int(parts.path.lstrip("/") or 0)
+        self._reader = None
+        self._writer = None
+        self._lock = None
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port, ssl=self.tls or None)
+        if self.password:
+            credentials = (self.username, self.password) if self.username else (self.password,)
+            await self._send("AUTH", *credentials)
+        if self.db:
+            await self._send("SELECT", str(self.db))
+
+    async def _send(self, *args):
+        command = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            arg = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            command.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self._writer.write(b"".join(command))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RuntimeError(f"Redis error: {rest.decode()}")
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            return None if length < 0 else (await self._reader.readexactly(length + 2))[:-2]
+        raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+
+    async def command(self, *args):
+        # One connection per process; commands take turns on it
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    await self._connect()
+                return await self._send(*args)
+            except BaseException:
+                # Errors and cancellation can leave a reply unread on the stream -
+                # drop the connection so the next command can't read it as its own
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+                raise
+
+    async def get(self, key: str):
+        return await self.command("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self.command("SET", key, value, "PX", int(ttl * 1000))
+
+    # Delete the lock only if it still holds our token - it may have expired and been retaken
+    UNLOCK_SCRIPT = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end return 0"
+
+    async def lock(self, key: str, ttl: float):
+        token = uuid.uuid4().hex
+        reply = await self.command("SET", "lock:" + key, token, "NX", "PX", int(ttl * 1000))
+        return token if reply == "OK" else False
+
+    async def unlock(self, key: str, token: str) -> None:
+        await self.command("EVAL", self.UNLOCK_SCRIPT, 1, "lock:" + key, token)
+
+
+def open_l2_cache(url: str):
+    """Build the shared cache tier from CACHE_URL (sqlite:///path, redis://host:port/db or rediss:// for TLS)."""
+    if not url:
+        return None
+    if url.startswith("sqlite:///"):
+        return SQLiteCache(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://")):
+        return RedisCache(url)
+    raise ValueError(f"Unsupported CACHE_URL: {url}")
+
+
+class TwoLevelCache:
+    """In-process LRU (L1) in front of an optional shared store (L2), with stampede protection.
+
+    Only one caller per key computes a missing value: others in this process
+    await the same future, and other processes wait on an L2 lock until the
+    value shows up. Falsy results (failed upstream calls) are never cached.
+    """
+
+    def __init__(self, ttl: float, l1_size: int = 256, l2=None, lock_ttl: float = API_TIMEOUT + 5):
+        self.ttl = ttl
+        self.l1_size = l1_size
+        self.l2 = l2
+        self.lock_ttl = lock_ttl
+        self._l1 = OrderedDict()
+        self._inflight = {}
+        self._stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "coalesced": 0, "l2_waits": 0, "l2_errors": 0}
+
+    def _l1_get(self, key: str):
+        entry = self._l1.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._l1[key]
+            return None
+        self._l1.move_to_end(key)
+        return value
+
+    def _l1_set(self, key: str, value) -> None:
+        self._l1[key] = (time.monotonic() + self.ttl, value)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_size:
+            self._l1.popitem(last=False)
+
+    async def _l2_call(self, method: str, *args):
+        try:
+            return await getattr(self.l2, method)(*args)
+        except Exception as e:  # A broken L2 must never break a tool
+            self._stats["l2_errors"] += 1
+            logger.warning(f"Shared cache {method} failed: {e}")
+            return None
+
+    async def _l2_get(self, key: str):
+        data = await self._l2_call("get", key)
+        return unpack_value(data) if data is not None else None
+
+    async def get_or_compute(self, key: str, compute, cache_if=bool):
+        """Return the cached value for key, or await compute() once and cache it if cache_if(value)."""
+        if self.ttl <= 0:
+            return await compute()
+        
+        value = self._l1_get(key)
+        if value is not None:
+            self._stats["l1_hits"] += 1
+            return value
+        
+        # The load runs in its own task so cancelling one caller (an MCP
+        # request the client gave up on) never aborts the others waiting on it
+        task = self._inflight.get(key)
+        if task is not None:
+            self._stats["coalesced"] += 1
+        else:
+            task = asyncio.create_task(self._load(key, compute, cache_if))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish_load(key, done))
+        return await asyncio.shield(task)
+
+    def _finish_load(self, key: str, task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every caller was cancelled
+
+    async def _load(self, key: str, compute, cache_if):
+        locked = False  # Our L2 lock token once we hold the lock
+        if self.l2:
+            value = await self._l2_get(key)
+            if value is not None:
+                self._stats["l2_hits"] += 1
+                self._l1_set(key, value)
+                return value
+            
+            locked = await self._l2_call("lock", key, self.lock_ttl)
+            if locked is False:  # None means L2 is down - just compute
+                # Another process is computing this key - wait for its result
+                self._stats["l2_waits"] += 1
+                deadline = time.monotonic() + self.lock_ttl
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(0.1)
+                    value = await self._l2_get(key)
+                    if value is not None:
+                        self._stats["l2_hits"] += 1
+                        self._l1_set(key, value)
+                        return value
+                    # The holder may have finished without caching (a failed call) - take over
+                    locked = await self._l2_call("lock", key, self.lock_ttl)
+                    if locked is not False:
+                        break
+        
+        self._stats["misses"] += 1
+        try:
+            value = await compute()
+            if cache_if(value):
+                self._l1_set(key, value)
+                if self.l2:
+                    await self._l2_call("set", key, pack_value(value), self.ttl)
+            return value
+        finally:
+            if locked:
+                await self._l2_call("unlock", key, locked)
+
+    def stats(self) -> dict:
+        return dict(self._stats, l1_entries=len(self._l1), ttl=self.ttl, l2=type(self.l2).__name__ if self.l2 else None)
+
+
+response_cache = TwoLevelCache(CACHE_TTL, CACHE_L1_SIZE, open_l2_cache(CACHE_URL) if CACHE_TTL > 0 else None)
+
+# 💡 LEARNING: stdio servers live only as long as one client session!
+#    - L1 (a dict in this process) is fast but dies with the session
+#    - L2 (SQLite file or Redis) is shared by every process and survives restarts
+#    - Only one caller computes a missing key; everyone else waits for it
+
+# ============================================================================
+# RECORD / REPLAY - Reproducible Upstream Traffic
+# ============================================================================
+
+class Cassette:
+    """Gzipped JSON-lines log of upstream calls (request key, response, timing).
+
+    Requests are matched on URL plus body, minus credentials and the sampling
+    knobs (max_tokens, temperature, stop), so a replay still matches after
+    generation profiles change. Repeated requests are replayed in recorded order,
+    cycling when the recording runs out.
+    """
+
+    SECRET_FIELDS = ("username", "password")
+    SAMPLING_FIELDS = ("max_tokens", "temperature", "stop")
+
+    def __init__(self, path: str, latency_scale: float = 1.0):
+        self.path = path
+        self.latency_scale = latency_scale
+        self._entries = None
+
+    @classmethod
+    def match_key(cls, url: str, json_body=None, data=None) -> str:
+        body = {k: v for k, v in (json_body or {}).items() if k not in cls.SAMPLING_FIELDS}
+        form = {k: v for k, v in (data or {}).items() if k not in cls.SECRET_FIELDS}
+        return cache_key(url.split("://", 1)[-1].split("/", 1)[-1], json.dumps([body, form], sort_keys=True))
+
+    def record(self, key: str, url: str, response: httpx.Response, elapsed: float) -> None:
+        """Append one call (each append is its own gzip member, so processes can share a file)."""
+        entry = {"key": key, "url": url, "status": response.status_code, "elapsed": round(elapsed, 4)}
+        try:
+            entry["json"] = response.json()
+        except ValueError:
+            entry["text"] = response.text
+        line = json.dumps(entry, separators=(",", ":"), ensure_ascii=False) + "\n"
+        with open(self.path, "ab") as cassette:
+            if fcntl:
+                fcntl.flock(cassette, fcntl.LOCK_EX)
+            try:
+                cassette.write(gzip.compress(line.encode("utf-8")))
+            finally:
+                if fcntl:
+                    fcntl.flock(cassette, fcntl.LOCK_UN)
+
+    def load(self) -> int:
+        self._entries = {}
+        with gzip.open(self.path, "rt", encoding="utf-8") as cassette:
+            for line in cassette:
+                entry = json.loads(line)
+                self._entries.setdefault(entry["key"], deque()).append(entry)
+        return sum(len(entries) for entries in self._entries.values())
+
+    async def replay(self, key: str, url: str) -> httpx.Response:
+        if self._entries is None:
+            self.load()
+        entries = self._entries.get(key)
+        if not entries:
+            raise httpx.ConnectError(f"No recorded response for {url}")
+        entry = entries[0]
+        entries.rotate(-1)
+        if self.latency_scale > 0:
+            await asyncio.sleep(entry["elapsed"] * self.latency_scale)
+        request = httpx.Request("POST", url)
+        if "json" in entry:
+            return httpx.Response(entry["status"], json=entry["json"], request=request)
+        return httpx.Response(entry["status"], text=entry["text"], request=request)
+
+
+cassette = Cassette(CASSETTE_PATH, REPLAY_LATENCY_SCALE) if UPSTREAM_MODE in ("record", "replay") else None
+
+
+async def upstream_post(url: str, *, json_body=None, data=None, headers=None, timeout: float = API_TIMEOUT) -> httpx.Response:
+    """POST to OpenAI/Imgflip - or record/replay the call, depending on UPSTREAM_MODE."""
+    key = Cassette.match_key(url, json_body, data) if cassette else ""
+    if cassette and UPSTREAM_MODE == "replay":
+        return await cassette.replay(key, url)
+    
+    started = time.perf_counter()
+    async with httpx.AsyncClient() as client:
+        response = await client.post(url, json=json_body, data=data, headers=headers, timeout=timeout)
+    
+    if cassette:
+        try:
+            await worker_pools.run_in_thread(cassette.record, key, url, response, time.perf_counter() - started)
+        except OSError as e:
+            logger.warning(f"Could not record upstream call: {e}")
+    return response
+
+# 💡 LEARNING: Live APIs make benchmarks noisy!
+#    - UPSTREAM_MODE=record saves every OpenAI/Imgflip call with its timing
+#    - UPSTREAM_MODE=replay serves them back offline (REPLAY_LATENCY_SCALE=0.5 = twice as fast)
+#    - KAREN_SEED makes every random choice repeatable
+
+# ============================================================================
+# ASYNC JOBS - Don't Hold the MCP Request Open for Slow Tools
+# ============================================================================
+
+class Job:
+    """One background tool run, readable at karen://jobs/<id> until it expires or is evicted."""
+
+    __slots__ = ("id", "tool", "status", "result", "error", "created", "finished", "task")
+
+    def __init__(self, job_id: str, tool: str):
+        self.id = job_id
+        self.tool = tool
+        self.status = "queued"  # queued -> running -> done / failed
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.task = None
+
+    @property
+    def uri(self) -> str:
+        return f"karen://jobs/{self.id}"
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "tool": self.tool,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+class JobManager:
+    """Runs slow tools in the background on a bounded number of workers.
+
+    At most ``max_outstanding`` jobs may be queued or running; finished jobs
+    are forgotten ``ttl`` seconds after they complete, and only the newest
+    ``max_finished`` of them are kept.
+    """
+
+    def __init__(self, workers: int = 4, max_outstanding: int = 100, ttl: float = 600, max_finished: int = 500):
+        self.workers = max(1, workers)
+        self.max_outstanding = max_outstanding
+        self.ttl = ttl
+        self.max_finished = max(0, max_finished)
+        self._jobs = {}
+        self._finished = deque()  # Finished job ids, oldest first
+        self._slots = None
+
+    def _sweep(self) -> None:
+        cutoff = time.time() - self.ttl
+        while self._finished and (
+            len(self._finished) > self.max_finished or self._jobs[self._finished[0]].finished <= cutoff
+        ):
+            del self._jobs[self._finished.popleft()]
+
+    def outstanding(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status in ("queued", "running"))
+
+    def get(self, job_id: str):
+        self._sweep()
+        return self._jobs.get(job_id)
+
+    def submit(self, tool: str, make_coro, notify=None) -> Job:
+        """Schedule make_coro() and return its Job at once; notify(job) is awaited when it finishes."""
+        self._sweep()
+        if self.outstanding() >= self.max_outstanding:
+            raise RuntimeError(f"Too many outstanding jobs ({self.max_outstanding})")
+        job = Job(uuid.uuid4().hex[:12], tool)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, make_coro, notify))
+        return job
+
+    async def _run(self, job: Job, make_coro, notify) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        async with self._slots:
+            job.status = "running"
+            try:
+                job.result = await make_coro()
+                job.status = "done"
+            except Exception as e:
+                logger.error(f"Job {job.id} ({job.tool}) failed: {e}")
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished = time.time()
+                job.task = None
+                self._finished.append(job.id)
+                self._sweep()
+        
+        if notify:
+            try:
+                await notify(job)
+            except Exception as e:  # The client may be gone, or the transport can't notify
+                logger.warning(f"Could not send completion notification for job {job.id}: {e}")
+
+    def stats(self) -> dict:
+        self._sweep()
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return dict(
+            counts, workers=self.workers, max_outstanding=self.max_outstanding, ttl=self.ttl,
+            max_finished=self.max_finished,
+        )
+
+
+job_manager = JobManager(JOB_WORKERS, JOB_MAX_OUTSTANDING, JOB_TTL, JOB_MAX_FINISHED)
+
+# 💡 LEARNING: MCP requests don't have to wait for slow work!
+#    - start_job returns a job id right away
+#    - The result is a resource (karen://jobs/<id>) or get_job_result(job_id)
+#    - Clients get a log notification when the job is done
 
 # === UTILITY FUNCTIONS ===
 
-async def call_openai(prompt: str, system_prompt: str = "") -> str:
-    """Make a request to OpenAI API."""
-    if not OPENAI_API_KEY:
+async def call_openai(prompt: str, system_prompt: str = "", tool_type: str = "") -> str:
+    """Make a request to OpenAI API (cached for CACHE_TTL seconds when caching is on)."""
+    if not OPENAI_API_KEY and UPSTREAM_MODE != "replay":
         logger.warning("No OpenAI API key provided, using fallback responses")
         return ""
     
+    key = cache_key("openai", OPENAI_MODEL, tool_type, system_prompt, prompt)
+    content, truncated = await response_cache.get_or_compute(
+        key,
+        lambda: request_openai(prompt, system_prompt, tool_type),
+        cache_if=lambda result: bool(result[0]) and not result[1],  # Never cache cut-off answers
+    )
+    return content
+
+async def request_openai(prompt: str, system_prompt: str, tool_type: str) -> tuple:
+    """Send a chat completion request; returns (content, truncated).
+
+    If the answer hits a max_tokens cap that TokenBudget tightened, it is asked
+    again once at the profile cap. Complete answers are saved per tool_type when
+    a store is configured.
+    """
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+    
+    profile = GENERATION_PROFILES.get(tool_type, DEFAULT_GENERATION_PROFILE)
+    max_tokens = token_budget.max_tokens(tool_type, profile) if ADAPTIVE_MAX_TOKENS else profile.max_tokens
+    
     try:
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": prompt})
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
+        while True:
+            body = {
+                "model": OPENAI_MODEL,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": profile.temperature,
+            }
+            if profile.stop:
+                body["stop"] = list(profile.stop)
+            
+            response = await upstream_post(
+                f"{OPENAI_BASE_URL}/chat/completions",
                 headers={
                     "Authorization": f"Bearer {OPENAI_API_KEY}",
                     "Content-Type": "application/json"
                 },
-                json={
-                    "model": OPENAI_MODEL,
-                    "messages": messages,
-                    "max_tokens": 300,
-                    "temperature": 0.8
-                },
+                json_body=body,
                 timeout=API_TIMEOUT
             )
             response.raise_for_status()
             result = response.json()
-            return result["choices"][0]["message"]["content"].strip()
+            choice = result["choices"][0]
+            content = choice["message"]["content"].strip()
+            truncated = choice.get("finish_reason") == "length"
+            
+            # Replayed traffic must not teach the budget or refill the store again
+            if tool_type and UPSTREAM_MODE != "replay":
+                completion_tokens = result.get("usage", {}).get("completion_tokens")
+                token_budget.record(tool_type, completion_tokens, truncated=truncated)
+            
+            if truncated and max_tokens < profile.max_tokens:
+                logger.info(f"{tool_type} answer cut off at {max_tokens} tokens, retrying at {profile.max_tokens}")
+                max_tokens = profile.max_tokens
+                continue
+            break
     
     except Exception as e:
         logger.error(f"OpenAI API error: {e}")
-        return ""
+        return "", False
+    
+    if content and not truncated and tool_type and response_store and UPSTREAM_MODE != "replay":
+        try:
+            await worker_pools.run_in_thread(response_store.append, tool_type, content)
+        except OSError as e:
+            logger.warning(f"Could not save response to store: {e}")
+    return content, truncated
 
 def get_fallback_response(tool_type: str) -> str:
     """Get a random fallback response for the given tool type."""
-    responses = FALLBACK_RESPONSES.get(tool_type, ["This is UNACCEPTABLE!"])
-    return random.choice(responses)
+    if response_store:
+        try:
+            stored = response_store.sample(tool_type)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read response store: {e}")
+            stored = ""
+        if stored:
+            return stored
+    responses = FALLBACK_RESPONSES.get(tool_type, ("This is UNACCEPTABLE!",))
+    return rng.choice(responses)
 
 # === MCP TOOLS - PM EDITION ===
 
@@ -214,7 +1219,7 @@ async def demand_feature_immediately(feature: str = "", deadline: str = "") -> s
     
     prompt = f"Demand that engineers build '{feature}' {deadline} and act like it's a trivial task"
     
-    ai_response = await call_openai(prompt, system_prompt)
+    ai_response = await call_openai(prompt, system_prompt, "demand_feature_immediately")
     
     if ai_response:
         return f"💼🔥 PM KAREN DEMANDS 🔥💼\n\n{ai_response}\n\n⚡ *Completely ignoring technical reality and sprint planning*"
@@ -244,7 +1249,7 @@ async def override_engineering_estimate(task: str = "", original_estimate: str =
     
     prompt = f"Override the engineering estimate of '{original_estimate}' for '{task}' and demand it be done '{new_deadline}'"
     
-    ai_response = await call_openai(prompt, system_prompt)
+    ai_response = await call_openai(prompt, system_prompt, "override_engineering_estimate")
     
     if ai_response:
         return f"📊❌ ESTIMATE OVERRIDE ACTIVATED ❌📊\n\n{ai_response}\n\n🎯 *Completely disrespecting engineering expertise and technical complexity*"
@@ -271,7 +1276,7 @@ async def change_requirements_post_deployment(original_feature: str = "", new_re
     
     prompt = f"Act like '{new_requirement}' was always part of the requirements for '{original_feature}' even though you never mentioned it before"
     
-    ai_response = await call_openai(prompt, system_prompt)
+    ai_response = await call_openai(prompt, system_prompt, "change_requirements_post_deployment")
     
     if ai_response:
         return f"📝🔄 REQUIREMENTS CHANGE GASLIGHTING 🔄📝\n\n{ai_response}\n\n🧠 *Rewriting history and blaming engineers for not reading minds*"
@@ -298,7 +1303,7 @@ async def invoke_competitor_feature(competitor: str = "", feature: str = "") ->
     
     prompt = f"Demand that we copy '{feature}' from '{competitor}' and act like it should be trivial to implement"
     
-    ai_response = await call_openai(prompt, system_prompt)
+    ai_response = await call_openai(prompt, system_prompt, "invoke_competitor_feature")
     
     if ai_response:
         return f"📱👀 COMPETITOR COMPARISON DEMAND 👀📱\n\n{ai_response}\n\n🎯 *Ignoring all technical and business context while demanding feature copies*"
@@ -324,7 +1329,7 @@ async def escalate_to_ceo_over_ui_color(ui_element: str = "", preferred_color: s
     
     prompt = f"Escalate the '{ui_element}' decision (wanting '{preferred_color}') to CEO level as if it's a critical business emergency"
     
-    ai_response = await call_openai(prompt, system_prompt)
+    ai_response = await call_openai(prompt, system_prompt, "escalate_to_ceo_over_ui_color")
     
     if ai_response:
         return f"🚨💼 CEO ESCALATION PROTOCOL 💼🚨\n\n{ai_response}\n\n📧 *CCing entire executive team on trivial UI decisions*"
@@ -350,7 +1355,7 @@ async def schedule_unnecessary_meeting(topic: str = "", duration: str = "") -> s
     
     prompt = f"Schedule an unnecessary '{duration}' meeting to discuss '{topic}' and invite way too many people"
     
-    ai_response = await call_openai(prompt, system_prompt)
+    ai_response = await call_openai(prompt, system_prompt, "schedule_unnecessary_meeting")
     
     if ai_response:
         return f"📅💤 MEETING OVERLOAD ACTIVATED 💤📅\n\n{ai_response}\n\n⏰ *Converting 5-minute decisions into multi-hour committee discussions*"
@@ -377,7 +1382,7 @@ async def request_daily_status_updates(project: str = "", detail_level: str = ""
     
     prompt = f"Demand excessive status updates on '{project}' including '{detail_level}' and act like this helps productivity"
     
-    ai_response = await call_openai(prompt, system_prompt)
+    ai_response = await call_openai(prompt, system_prompt, "request_daily_status_updates")
     
     if ai_response:
         return f"📊🔍 MICROMANAGEMENT MODE ENGAGED 🔍📊\n\n{ai_response}\n\n⏱️ *Treating complex development like factory production with hourly quotas*"
@@ -404,7 +1409,7 @@ async def create_urgent_non_urgent_task(task: str = "", fake_deadline: str = "")
     
     prompt = f"Make '{task}' sound incredibly urgent with deadline '{fake_deadline}' even though it's completely non-critical"
     
-    ai_response = await call_openai(prompt, system_prompt)
+    ai_response = await call_openai(prompt, system_prompt, "create_urgent_non_urgent_task")
     
     if ai_response:
         return f"🚨⚡ FAKE URGENCY GENERATOR ⚡🚨\n\n{ai_response}\n\n🎭 *Converting routine tasks into imaginary emergencies*"
@@ -431,7 +1436,7 @@ async def bypass_development_process(feature: str = "", process_step: str = "")
     
     prompt = f"Convince engineers to skip '{process_step}' for '{feature}' and act like it's unnecessary overhead"
     
-    ai_response = await call_openai(prompt, system_prompt)
+    ai_response = await call_openai(prompt, system_prompt, "bypass_development_process")
     
     if ai_response:
         return f"⚠️🚀 PROCESS BYPASS PROTOCOL 🚀⚠️\n\n{ai_response}\n\n🎲 *Rolling dice with product quality and security*"
@@ -461,7 +1466,7 @@ async def demand_impossible_integration(service_a: str = "", service_b: str = ""
     
     prompt = f"Demand integration between '{service_a}' and '{service_b}' {timeframe} and act like technical constraints don't exist"
     
-    ai_response = await call_openai(prompt, system_prompt)
+    ai_response = await call_openai(prompt, system_prompt, "demand_impossible_integration")
     
     if ai_response:
         return f"🔌💥 IMPOSSIBLE INTEGRATION DEMAND 💥🔌\n\n{ai_response}\n\n🧩 *Treating incompatible systems like plug-and-play toys*"
@@ -489,7 +1494,7 @@ async def generate_sarcastic_status_update(project: str = "", actual_status: str
     
     prompt = f"Write a sarcastic status update for '{project}' where the actual situation is '{actual_status}'"
     
-    ai_response = await call_openai(prompt, system_prompt)
+    ai_response = await call_openai(prompt, system_prompt, "generate_sarcastic_status_update")
     
     if ai_response:
         return f"📊😏 SARCASTIC STATUS UPDATE 😏📊\n\n{ai_response}\n\n🎭 *Reporting complete chaos as 'minor bumps in the road'*"
@@ -510,7 +1515,7 @@ async def random_feature_request() -> str:
     
     prompt = "Generate one completely absurd, random feature request that makes no sense but act like it's genius"
     
-    ai_response = await call_openai(prompt, system_prompt)
+    ai_response = await call_openai(prompt, system_prompt, "random_feature_request")
     
     if ai_response:
         return f"🎲💡 RANDOM FEATURE REQUEST 💡🎲\n\n{ai_response}\n\n🤪 *Generating chaos disguised as 'innovation'*"
@@ -526,100 +1531,206 @@ async def generate_pm_meme(scenario: str = "", meme_type: str = "") -> str:
     if not scenario.strip():
         scenario = "demanding features with impossible deadlines"
     
-    # Map scenario keywords to appropriate meme templates and text
-    meme_configs = {
-        "deadline": {
-            "template_id": PM_MEME_TEMPLATES["drake"],
-            "text0": "Following realistic sprint planning",
-            "text1": "Promising features by tomorrow"
-        },
-        "competitor": {
-            "template_id": PM_MEME_TEMPLATES["distracted_boyfriend"],
-            "text0": "Our Technical Roadmap",
-            "text1": "PM",
-            "text2": "Competitor's Feature Screenshot"
-        },
-        "process": {
-            "template_id": PM_MEME_TEMPLATES["drake"],
-            "text0": "Testing and code review",
-            "text1": "Shipping untested code immediately"
-        },
-        "estimate": {
-            "template_id": PM_MEME_TEMPLATES["is_this"],
-            "text0": "Is this a simple 5-minute change?",
-            "text1": "Complex 3-sprint feature"
-        },
-        "fire": {
-            "template_id": PM_MEME_TEMPLATES["this_is_fine"],
-            "text0": "Everything is going",
-            "text1": "exactly as planned"
-        },
-        "simple": {
-            "template_id": PM_MEME_TEMPLATES["change_my_mind"],
-            "text0": "This is just adding a button",
-            "text1": "Change my mind"
-        },
-        "buttons": {
-            "template_id": PM_MEME_TEMPLATES["two_buttons"],
-            "text0": "Follow development process",
-            "text1": "Ship broken feature fast"
-        },
-        "testing": {
-            "template_id": PM_MEME_TEMPLATES["one_does_not_simply"],
-            "text0": "One does not simply",
-            "text1": "Skip testing in production"
-        }
-    }
-    
-    # Choose meme based on scenario or random
-    config = None
-    for key, template_config in meme_configs.items():
-        if key in scenario.lower():
-            config = template_config
-            break
+    # Choose meme based on scenario keywords, or pick one at random
+    spec = next((spec for spec in MEME_SPECS if spec.keyword in scenario.lower()), None)
+    if not spec:
+        spec = rng.choice(MEME_SPECS)
     
-    # Default to random meme if no match
-    if not config:
-        config = random.choice(list(meme_configs.values()))
+    key = cache_key("imgflip", spec.template_id, *spec.texts)
+    meme = await response_cache.get_or_compute(key, lambda: caption_meme(spec))
     
+    if meme:
+        return f"🎨😂 KAREN PM MEME GENERATOR 😂🎨\n\n✨ Meme created for: {scenario}\n\n🔗 View your meme: {meme['url']}\n📄 Share page: {meme['page_url']}\n\n💡 *Capturing PM behavior in meme form*"
+    else:
+        fallback = get_fallback_response("generate_pm_meme")
+        return f"🎨😂 KAREN PM MEME GENERATOR 😂🎨\n\n{fallback}\n\n💡 *Meme concept for: {scenario}*"
+
+async def caption_meme(spec: MemeSpec) -> dict:
+    """Caption a meme template via Imgflip; returns {"url", "page_url"} or {} on failure."""
     try:
+        params = {
+            "template_id": spec.template_id,
+            "username": IMGFLIP_USERNAME or "imgflip_hubot",
+            "password": IMGFLIP_PASSWORD or "imgflip_hubot",
+        }
+        
+        # Add text boxes based on template
+        for i, text in enumerate(spec.texts):
+            params[f"boxes[{i}][text]"] = text
+        
         # Generate meme via Imgflip API
-        async with httpx.AsyncClient() as client:
-            params = {
-                "template_id": config["template_id"],
-                "username": IMGFLIP_USERNAME or "imgflip_hubot",
-                "password": IMGFLIP_PASSWORD or "imgflip_hubot",
-            }
-            
-            # Add text boxes based on template
-            for i in range(3):
-                text_key = f"text{i}"
-                if text_key in config:
-                    params[f"boxes[{i}][text]"] = config[text_key]
-            
-            response = await client.post(
-                "https://api.imgflip.com/caption_image",
-                data=params,
-                timeout=15
-            )
-            response.raise_for_status()
-            result = response.json()
-            
-            if result.get("success"):
-                meme_url = result["data"]["url"]
-                page_url = result["data"]["page_url"]
-                
-                return f"🎨😂 KAREN PM MEME GENERATOR 😂🎨\n\n✨ Meme created for: {scenario}\n\n🔗 View your meme: {meme_url}\n📄 Share page: {page_url}\n\n💡 *Capturing PM behavior in meme form*"
-            else:
-                error_msg = result.get("error_message", "Unknown error")
-                logger.warning(f"Imgflip API returned error: {error_msg}")
-                fallback = get_fallback_response("generate_pm_meme")
-                return f"🎨😂 KAREN PM MEME GENERATOR 😂🎨\n\n{fallback}\n\n💡 *Meme concept for: {scenario}*"
+        response = await upstream_post(
+            f"{IMGFLIP_API_URL}/caption_image",
+            data=params,
+            timeout=15
+        )
+        response.raise_for_status()
+        result = response.json()
+        
+        if result.get("success"):
+            return {"url": result["data"]["url"], "page_url": result["data"]["page_url"]}
+        else:
+            error_msg = result.get("error_message", "Unknown error")
+            logger.warning(f"Imgflip API returned error: {error_msg}")
+            return {}
     
     except Exception as e:
         logger.error(f"Meme generation error: {e}")
-        fallback = get_fallback_response("generate_pm_meme")
-        return f"🎨😂 KAREN PM MEME GENERATOR 😂🎨\n\n{fallback}\n\n💡 *Meme concept for: {scenario}*"
+        return {}
+
+# === MCP TOOLS - ASYNC JOBS ===
+
+# MCP log levels, least to most severe
+LOG_LEVELS = ("debug", "info", "notice", "warning", "error", "critical", "alert", "emergency")
+
+# The level each client asked for with logging/setLevel (until then it gets everything)
+client_log_levels = weakref.WeakKeyDictionary()
+
+
+@mcp._mcp_server.set_logging_level()
+async def set_logging_level(level: str) -> None:
+    """Handle logging/setLevel - registering it also advertises the logging capability."""
+    client_log_levels[mcp._mcp_server.request_context.session] = level
+
+
+async def send_client_log(session, level: str, message: str) -> None:
+    """Send a notifications/message log to one client, if it wants messages at this level."""
+    wanted = client_log_levels.get(session, "debug")
+    if LOG_LEVELS.index(level) >= LOG_LEVELS.index(wanted):
+        await session.send_log_message(level=level, data=message, logger="karen-jobs")
+
+# Tools that wait on OpenAI or Imgflip, and so are worth running as jobs
+ASYNC_JOB_TOOLS = {
+    tool.__name__: tool
+    for tool in (
+        demand_feature_immediately,
+        override_engineering_estimate,
+        change_requirements_post_deployment,
+        invoke_competitor_feature,
+        escalate_to_ceo_over_ui_color,
+        schedule_unnecessary_meeting,
+        request_daily_status_updates,
+        create_urgent_non_urgent_task,
+        bypass_development_process,
+        demand_impossible_integration,
+        generate_sarcastic_status_update,
+        random_feature_request,
+        generate_pm_meme,
+    )
+}
+
+@mcp.tool()
+async def start_job(tool: str, arguments: dict[str, str] | None = None, ctx: Context = None) -> str:
+    """Start a slow Karen tool in the background and return a job id immediately (fetch it with get_job_result)."""
+    logger.info(f"Executing start_job for: {tool}")
+    
+    handler = ASYNC_JOB_TOOLS.get(tool)
+    if not handler:
+        return f"❓ Unknown tool '{tool}'. Jobs can run: {', '.join(ASYNC_JOB_TOOLS)}"
+    
+    arguments = arguments or {}
+    try:
+        inspect.signature(handler).bind(**arguments)
+    except TypeError as e:
+        return f"❌ Bad arguments for {tool}: {e}"
+    
+    # Every Karen tool takes text parameters - catch mistakes now, not inside the job
+    not_text = [name for name, value in arguments.items() if not isinstance(value, str)]
+    if not_text:
+        return f"❌ Bad arguments for {tool}: {', '.join(not_text)} must be text"
+    
+    notify = None
+    if ctx is not None:
+        session = ctx.session
+        
+        # Sent as an MCP log message - the server advertises the logging capability
+        async def notify(job):
+            await send_client_log(
+                session,
+                "info" if job.status == "done" else "error",
+                f"Job {job.id} ({job.tool}) {job.status} - read {job.uri} or call get_job_result",
+            )
+    
+    try:
+        job = job_manager.submit(tool, lambda: handler(**arguments), notify)
+    except RuntimeError as e:
+        return f"🚫 {e} - wait for some to finish and try again"
+    
+    return f"⏳ JOB STARTED ⏳\n\nJob id: {job.id}\nTool: {tool}\n\n📬 Get the result with get_job_result or read {job.uri}"
+
+@mcp.tool()
+async def get_job_result(job_id: str) -> str:
+    """Get the result of a job started with start_job (or its status if it isn't finished yet)."""
+    logger.info(f"Executing get_job_result for: {job_id}")
+    
+    job = job_manager.get(job_id.strip())
+    if not job:
+        return f"❓ No job '{job_id}'. Finished jobs are kept for {job_manager.ttl:g} seconds."
+    if job.status == "done":
+        return job.result
+    if job.status == "failed":
+        return f"❌ Job {job.id} ({job.tool}) failed: {job.error}"
+    return f"⏳ Job {job.id} ({job.tool}) is still {job.status}... check back in a moment!"
+
+# === MCP RESOURCES - SERVER METRICS ===
+
+@mcp.resource("karen://jobs/{job_id}", mime_type="application/json")
+def job_status(job_id: str) -> str:
+    """Status and (once finished) result of a background job."""
+    job = job_manager.get(job_id)
+    if not job:
+        raise ValueError(f"Unknown or expired job: {job_id}")
+    return json.dumps(job.to_dict(), indent=2, ensure_ascii=False)
+
+@mcp.resource("karen://metrics/jobs", mime_type="application/json")
+def job_metrics() -> str:
+    """How many background jobs are queued, running and finished."""
+    return json.dumps(job_manager.stats(), indent=2)
+
+@mcp.resource("karen://metrics/workers", mime_type="application/json")
+def worker_metrics() -> str:
+    """Worker pool queue depth, throughput and utilization."""
+    return json.dumps(worker_pools.stats(), indent=2)
+
+@mcp.resource("karen://metrics/process", mime_type="application/json")
+def process_metrics() -> str:
+    """PID, memory and CPU time of this server process (one process per stdio session)."""
+    return json.dumps(process_stats(), indent=2)
+
+
+def process_stats() -> dict:
+    """Current RSS plus CPU time for this process."""
+    cpu = os.times()
+    stats = {
+        "pid": os.getpid(),
+        "rss_bytes": None,
+        "cpu_user_seconds": round(cpu.user, 3),
+        "cpu_system_seconds": round(cpu.system, 3),
+    }
+    try:
+        with open("/proc/self/statm") as statm:  # Linux (and so Docker)
+            stats["rss_bytes"] = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    return stats
+
+@mcp.resource("karen://metrics/cache", mime_type="application/json")
+def cache_metrics() -> str:
+    """Hit rates for the in-process (L1) and shared (L2) cache tiers."""
+    return json.dumps(response_cache.stats(), indent=2)
+
+@mcp.resource("karen://metrics/generation", mime_type="application/json")
+def generation_metrics() -> str:
+    """Per-tool token caps and the completion lengths they were learned from."""
+    return json.dumps(token_budget.stats(), indent=2)
+
+@mcp.resource("karen://metrics/memory", mime_type="application/json")
+def memory_metrics() -> str:
+    """Memory audit: RSS, big structures, and (with KAREN_MEMORY_AUDIT=1) usage per module."""
+    return json.dumps(memory_audit(), indent=2)
+
+# 💡 LEARNING: Resources are read-only data an MCP client can fetch by URI.
+#    Tools DO things; resources SHOW things (like these metrics).
 
 # === SERVER STARTUP ===
 if __name__ == "__main__":
@@ -631,8 +1742,26 @@ if __name__ == "__main__":
     else:
         logger.info(f"Using OpenAI model: {OPENAI_MODEL}")
     
+    if cassette:
+        logger.info(f"Upstream mode: {UPSTREAM_MODE} ({CASSETTE_PATH})")
+    
+    if tracemalloc.is_tracing():
+        logger.info(f"Memory audit at startup: {json.dumps(memory_audit())}")
+    
+    profiler = None
+    if KAREN_PROFILE_DIR:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    
     try:
-        mcp.run(transport='stdio')
+        mcp.run(transport=MCP_TRANSPORT)
     except Exception as e:
         logger.error(f"Server error: {e}", exc_info=True)
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+    finally:
+        worker_pools.shutdown()
+        if profiler:
+            profiler.disable()
+            profile_path = os.path.join(KAREN_PROFILE_DIR, f"karen-{os.getpid()}.prof")
+            profiler.dump_stats(profile_path)
+            logger.info(f"Wrote profile to {profile_path}")
\ No newline at end of file
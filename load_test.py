@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Load test for Karen MCP Server - over real MCP transports
+
+Unlike test_karen_server.py (which calls the tool coroutines directly), this
+spawns karen_server.py and talks to it like a real MCP client, so JSON-RPC
+parsing, tool dispatch and serialization are all part of the measurement.
+
+OpenAI and Imgflip are replaced by a local fake upstream, so runs are free,
+offline and repeatable.
+
+Run with:
+    python load_test.py --transport stdio --sessions 8 --calls 25
+    python load_test.py --transport http --sessions 32 --calls 50 --profile-dir profiles
+
+Reports setup time, steady-state request throughput (clocked once every
+session has initialized), latency percentiles per MCP method, and memory /
+CPU for every server process. With --profile-dir the server writes a cProfile
+dump per process (and py-spy flame graphs if py-spy is installed and --py-spy
+is given).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+
+SERVER_PATH = Path(__file__).parent / "karen_server.py"
+
+# Tools exercised by default (all of them have defaults for every parameter)
+DEFAULT_TOOLS = [
+    "demand_feature_immediately",
+    "override_engineering_estimate",
+    "generate_sarcastic_status_update",
+    "random_feature_request",
+    "generate_pm_meme",
+]
+
+
+# ============================================================================
+# FAKE UPSTREAM - Pretends to be OpenAI and Imgflip
+# ============================================================================
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    """Answers chat completions and caption_image with canned JSON."""
+
+    delay = 0.0  # Seconds of simulated upstream latency
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        if self.delay:
+            time.sleep(self.delay)
+
+        if self.path.endswith("/chat/completions"):
+            body = {
+                "choices": [{
+                    "message": {"role": "assistant", "content": "This is a SIMPLE change! Ship it by lunch!"},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 120, "completion_tokens": 12, "total_tokens": 132},
+            }
+        elif self.path.endswith("/caption_image"):
+            body = {
+                "success": True,
+                "data": {"url": "https://i.imgflip.com/fake.jpg", "page_url": "https://imgflip.com/i/fake"},
+            }
+        else:
+            self.send_error(404)
+            return
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # Keep the report readable
+
+
+def start_fake_upstream(delay: float) -> ThreadingHTTPServer:
+    FakeUpstreamHandler.delay = delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeUpstreamHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# ============================================================================
+# LOAD GENERATOR - Many simulated MCP client sessions
+# ============================================================================
+
+class Recorder:
+    """Collects per-method latencies and per-process resource numbers."""
+
+    SETUP_METHODS = ("initialize", "tools/list")
+
+    def __init__(self, sessions: int):
+        self.latencies = {}
+        self.errors = 0
+        self.processes = {}
+        self.sessions = sessions
+        self.ready = 0
+        self.all_ready = asyncio.Event()
+        self.launched = self.started = self.finished = time.perf_counter()
+
+    async def session_ready(self):
+        """Wait until every session has initialized, so the clock only covers steady-state traffic."""
+        self.ready += 1
+        if self.ready == self.sessions:
+            self.started = time.perf_counter()
+            self.all_ready.set()
+        await self.all_ready.wait()
+
+    async def timed(self, method: str, coro):
+        started = time.perf_counter()
+        try:
+            result = await coro
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ {method} failed: {e}", file=sys.stderr)
+            return None
+        self.latencies.setdefault(method, []).append(time.perf_counter() - started)
+        if getattr(result, "isError", False):
+            self.errors += 1
+        return result
+
+
+async def run_session(session_id: int, session: ClientSession, args, recorder: Recorder):
+    await recorder.timed("initialize", session.initialize())
+    await recorder.timed("tools/list", session.list_tools())
+    await recorder.session_ready()
+
+    for i in range(args.calls):
+        tool = args.tools[(session_id + i) % len(args.tools)]
+        await recorder.timed("tools/call", session.call_tool(tool, {}))
+
+    # The server reports its own PID, RSS and CPU time - one process per stdio session
+    result = await recorder.timed("resources/read", session.read_resource("karen://metrics/process"))
+    if result:
+        stats = json.loads(result.contents[0].text)
+        recorder.processes[stats["pid"]] = stats
+
+
+async def stdio_session(session_id: int, env: dict, args, recorder: Recorder):
+    params = StdioServerParameters(command=sys.executable, args=[str(SERVER_PATH)], env=env)
+    with open(os.devnull, "w") as devnull:
+        async with stdio_client(params, errlog=devnull) as (read, write):
+            async with ClientSession(read, write) as session:
+                await run_session(session_id, session, args, recorder)
+
+
+async def http_session(session_id: int, url: str, args, recorder: Recorder):
+    async with streamablehttp_client(url) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await run_session(session_id, session, args, recorder)
+
+
+async def wait_for_port(port: int, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Server did not start listening on port {port}")
+
+
+def start_py_spy(pids, profile_dir: Path):
+    """Attach py-spy to server processes (needs ptrace permission)."""
+    py_spy = shutil.which("py-spy")
+    if not py_spy:
+        print("⚠️  py-spy not found on PATH - skipping flame graphs", file=sys.stderr)
+        return []
+    return [
+        subprocess.Popen(
+            [py_spy, "record", "--pid", str(pid), "--output", str(profile_dir / f"py-spy-{pid}.svg")],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        for pid in pids
+    ]
+
+
+async def run_load(args) -> Recorder:
+    upstream = start_fake_upstream(args.upstream_delay / 1000)
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}"
+
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "sk-load-test",
+        "OPENAI_BASE_URL": f"{upstream_url}/v1",
+        "IMGFLIP_API_URL": upstream_url,
+    })
+    if args.profile_dir:
+        env["KAREN_PROFILE_DIR"] = str(args.profile_dir)
+
+    recorder = Recorder(args.sessions)
+    server = None
+    spies = []
+    try:
+        if args.transport == "stdio":
+            # Every stdio client gets its own server process - just like Docker MCP
+            await asyncio.gather(*(stdio_session(i, env, args, recorder) for i in range(args.sessions)))
+        else:
+            port = free_port()
+            env.update({"MCP_TRANSPORT": "streamable-http", "MCP_HOST": "127.0.0.1", "MCP_PORT": str(port)})
+            server = subprocess.Popen(
+                [sys.executable, str(SERVER_PATH)], env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            await wait_for_port(port)
+            if args.py_spy and args.profile_dir:
+                spies = start_py_spy([server.pid], args.profile_dir)
+            url = f"http://127.0.0.1:{port}/mcp"
+            await asyncio.gather(*(http_session(i, url, args, recorder) for i in range(args.sessions)))
+    finally:
+        recorder.finished = time.perf_counter()
+        if server:
+            server.send_signal(signal.SIGINT)  # SIGINT lets the server shut down cleanly and write its profile
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        for spy in spies:
+            spy.send_signal(signal.SIGINT)
+            spy.wait(timeout=10)
+        upstream.shutdown()
+    return recorder
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def print_report(args, recorder: Recorder):
+    # Process spawn, imports and initialize are reported apart from the request rate
+    setup = recorder.started - recorder.launched
+    elapsed = recorder.finished - recorder.started
+    steady = sum(len(values) for method, values in recorder.latencies.items() if method not in Recorder.SETUP_METHODS)
+
+    print("=" * 72)
+    print(f"📈 KAREN MCP LOAD TEST - {args.transport}, {args.sessions} sessions x {args.calls} calls")
+    print("=" * 72)
+    print(f"Setup: {setup:.2f}s (server start + initialize for all sessions)")
+    print(f"Requests: {steady}   Errors: {recorder.errors}   Steady-state time: {elapsed:.2f}s")
+    print(f"Throughput: {steady / elapsed:.1f} req/s" if elapsed > 0 else "Throughput: n/a")
+    print()
+    print(f"{'method':<16}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for method, values in recorder.latencies.items():
+        ms = [v * 1000 for v in values]
+        print(
+            f"{method:<16}{len(ms):>7}{statistics.mean(ms):>10.1f}{percentile(ms, 50):>10.1f}"
+            f"{percentile(ms, 90):>10.1f}{percentile(ms, 99):>10.1f}{max(ms):>10.1f}"
+        )
+    print()
+    print(f"{'server pid':<16}{'rss MiB':>10}{'cpu user s':>12}{'cpu sys s':>12}")
+    for pid, stats in sorted(recorder.processes.items()):
+        rss = stats["rss_bytes"] / 2**20 if stats["rss_bytes"] else float("nan")
+        print(f"{pid:<16}{rss:>10.1f}{stats['cpu_user_seconds']:>12.2f}{stats['cpu_system_seconds']:>12.2f}")
+    if args.profile_dir:
+        print()
+        print(f"🔬 Profiles written to {args.profile_dir}/ (open .prof files with: python -m pstats <file>)")
+    print("=" * 72)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test Karen MCP Server over real MCP transports")
+    parser.add_argument("--transport", choices=["stdio", "http"], default="stdio")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent MCP client sessions")
+    parser.add_argument("--calls", type=int, default=20, help="tools/call requests per session")
+    parser.add_argument("--tools", nargs="+", default=DEFAULT_TOOLS, help="Tools to call (round-robin)")
+    parser.add_argument("--upstream-delay", type=float, default=0.0, help="Fake upstream latency in ms")
+    parser.add_argument("--profile-dir", type=Path, help="Write server cProfile dumps here")
+    parser.add_argument("--py-spy", action="store_true", help="Also record py-spy flame graphs (http only)")
+    args = parser.parse_args()
+
+    if args.profile_dir:
+        args.profile_dir.mkdir(parents=True, exist_ok=True)
+        args.profile_dir = args.profile_dir.resolve()
+
+    recorder = asyncio.run(run_load(args))
+    print_report(args, recorder)
+    return 1 if recorder.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())